@@ -1,6 +1,10 @@
 import speech_recognition as sr
 import pyttsx3
 from ollama import Client  # Changed import to Client
+import argparse
+from voice_pipeline import run_pipeline
+from memory_guard import DEFAULT_CAPS, KIOSK_CAPS, MemoryDiagnostics, format_report
+from profiling import add_profile_arguments, start_profiling
 
 # Initialize speech recognition, text-to-speech, and Ollama client
 recognizer = sr.Recognizer()
@@ -12,12 +16,18 @@ engine.setProperty('rate', new_rate)
 print(f"Speech rate adjusted from {default_rate} to {new_rate}") # Optional feedback
 ollama_client = Client()  # Changed to use Client class
 
-def recognize_speech():
-    """Listens for speech and converts it to text."""
+def capture_audio(timeout=None, phrase_time_limit=None):
+    """Listens on the microphone and returns the captured audio (None on timeout)."""
     with sr.Microphone() as source:
         print("Listening...")
         recognizer.adjust_for_ambient_noise(source)
-        audio = recognizer.listen(source)
+        try:
+            return recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+        except sr.WaitTimeoutError:
+            return None
+
+def transcribe_audio(audio):
+    """Converts captured audio to lowercase text ("" if it couldn't be understood)."""
     try:
         print("Recognizing...")
         text = recognizer.recognize_google(audio)
@@ -30,6 +40,10 @@ def recognize_speech():
         print(f"Could not request results from Google Speech Recognition service; {e}")
         return ""
 
+def recognize_speech():
+    """Listens for speech and converts it to text."""
+    return transcribe_audio(capture_audio())
+
 def generate_response(user_input):
     """Generates response using Ollama Llama 3."""
     try:
@@ -50,16 +64,23 @@ def speak_response(text):
 
 def main():
     """Main function to run the chatbot."""
+    parser = argparse.ArgumentParser(description="Voice chatbot using Ollama")
+    parser.add_argument("--kiosk", action="store_true", help="cap memory use for all-day sessions and log memory snapshots")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = start_profiling(args, "Chatbot")
+    caps = KIOSK_CAPS if args.kiosk else DEFAULT_CAPS
+    if caps.snapshot_interval:
+        diagnostics = MemoryDiagnostics()
+        diagnostics.start()
+        diagnostics.run_periodically(caps.snapshot_interval, lambda report: print(format_report(report)))
+
     print("Voice Chatbot Started with Ollama Llama 3!")
     speak_response("Voice Chatbot Started with Llama 3!")
-    while True:
-        user_input = recognize_speech()
-        if user_input:
-            response_text = generate_response(user_input)
-            print(f"Chatbot: {response_text}")
-            speak_response(response_text)
-            if "bye" in user_input or "exit" in user_input or "goodbye" in user_input:
-                break
+    # Capture, recognition, the model and speech run as overlapping asyncio stages.
+    # Listening times out every few seconds so an exit word can shut everything down.
+    run_pipeline(lambda: capture_audio(timeout=5, phrase_time_limit=caps.max_phrase_seconds), transcribe_audio, generate_response, speak_response,
+                 queue_size=caps.max_queued_audio, profiler=profiler)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,10 +4,15 @@ import speech_recognition as sr
 import pyttsx3
 from ollama import Client
 import threading
+import queue
+import argparse
+from memory_guard import DEFAULT_CAPS, KIOSK_CAPS, TranscriptLimiter, MemoryDiagnostics, format_report
+from profiling import add_profile_arguments, start_profiling
 
 class ChatbotUI:
-    def __init__(self, master):
+    def __init__(self, master, caps=DEFAULT_CAPS):
         self.master = master
+        self.caps = caps # Limits on transcript size, queued voice input and recording length
         master.title("Voice Chatbot UI (Mistral Model)") # Updated title
 
         self.recognizer = sr.Recognizer()
@@ -23,6 +28,7 @@ class ChatbotUI:
         # Chat History Display
         self.chat_display = scrolledtext.ScrolledText(master, wrap=tk.WORD, state=tk.DISABLED, height=20)
         self.chat_display.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        self.transcript = TranscriptLimiter(self.chat_display, caps.max_messages) # Drops the oldest messages past the cap
 
         # User Input Entry
         self.user_input_entry = Entry(master)
@@ -37,15 +43,21 @@ class ChatbotUI:
         self.voice_button = Button(master, text="Voice Input", command=self.start_voice_input)
         self.voice_button.pack(pady=(0, 10))
 
+        # Voice input requests are handled one at a time by a single worker thread
+        self.voice_jobs = queue.Queue(maxsize=caps.max_pending_jobs)
+        threading.Thread(target=self.voice_worker, daemon=True).start()
+
         self.add_bot_message("Voice Chatbot Started! (Using Mistral Model)") # Updated start message
         self.speak_response("Voice Chatbot Started! Using Mistral Model")
 
     def add_message(self, sender, message):
         """Adds a message to the chat display."""
         self.chat_display.config(state=tk.NORMAL)
+        self.transcript.begin_message()
         self.chat_display.insert(END, f"{sender}: {message}\n", sender)
         self.chat_display.tag_config("user", foreground="blue")
         self.chat_display.tag_config("bot", foreground="green")
+        self.transcript.trim()
         self.chat_display.config(state=tk.DISABLED)
         self.chat_display.see(END)
 
@@ -93,7 +105,12 @@ class ChatbotUI:
             print("Listening for voice input...")
             self.add_bot_message("Listening for voice input...") # UI feedback: message in chat
             self.recognizer.adjust_for_ambient_noise(source)
-            audio = self.recognizer.listen(source)
+            try:
+                audio = self.recognizer.listen(source, timeout=10, phrase_time_limit=self.caps.max_phrase_seconds)
+            except sr.WaitTimeoutError:
+                print("No speech heard")
+                self.add_bot_message("No speech heard. Click Voice Input to try again.")
+                return ""
         try:
             self.add_bot_message("Recognizing...") # UI feedback: message in chat
             print(f"Recognizing voice input...") # Console debug
@@ -118,14 +135,46 @@ class ChatbotUI:
             self.add_bot_message(bot_response_text)
             self.speak_response(bot_response_text)
 
+    def voice_worker(self):
+        """Handles queued voice input requests one at a time (in thread)."""
+        while True:
+            self.voice_jobs.get()
+            try:
+                self.process_voice_input()
+            except Exception as e:
+                # Keep the worker alive (e.g. no microphone, or TTS busy) so later clicks still work
+                print(f"Voice input error: {e}")
+                self.add_bot_message("Sorry, voice input failed. Please try again.")
+
     def start_voice_input(self):
-        """Starts voice input in a separate thread."""
-        threading.Thread(target=self.process_voice_input, daemon=True).start()
+        """Queues a voice input request for the worker thread."""
+        try:
+            self.voice_jobs.put_nowait(None)
+        except queue.Full:
+            print("Voice input already pending, ignoring click")
+            self.add_bot_message("Still working on your last voice input, please wait.")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Voice chatbot UI (Mistral model)")
+    parser.add_argument("--kiosk", action="store_true", help="cap memory use for all-day sessions and log memory snapshots")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = start_profiling(args, "ChatbotUpdatedUI")
+    if profiler:
+        profiler.instrument(ChatbotUI, {"add_message": "tk.add_message", "recognize_speech": "stt",
+                                        "generate_response": "llm", "speak_response": "tts"})
+
+    caps = KIOSK_CAPS if args.kiosk else DEFAULT_CAPS
+    if caps.snapshot_interval:
+        diagnostics = MemoryDiagnostics()
+        diagnostics.start()
+        diagnostics.run_periodically(caps.snapshot_interval, lambda report: print(format_report(report)))
+
     root = tk.Tk()
-    chatbot_ui = ChatbotUI(root)
+    if profiler:
+        profiler.watch_tk(root)
+    chatbot_ui = ChatbotUI(root, caps=caps)
     root.mainloop()
 
 if __name__ == "__main__":
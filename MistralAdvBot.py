@@ -1,20 +1,28 @@
 import tkinter as tk
+import tkinter.font
 from tkinter import scrolledtext, Entry, Button, END, WORD, RIGHT, Y, BOTH, X, TOP, BOTTOM, LEFT, Text, Menu, Scale, HORIZONTAL, Frame, Label, filedialog, colorchooser
 import speech_recognition as sr
 import pyttsx3
 from ollama import Client
 import threading
+import queue
+import argparse
+from tkinter import messagebox
 import pyperclip  # For clipboard functionality
+from memory_guard import DEFAULT_CAPS, KIOSK_CAPS, TranscriptLimiter, MemoryDiagnostics, format_report
+from profiling import add_profile_arguments, start_profiling
 
 class ChatbotUI:
-    def __init__(self, master):
+    def __init__(self, master, caps=DEFAULT_CAPS, recognizer=None, engine=None, ollama_client=None):
         self.master = master
+        self.caps = caps # Limits on transcript size, queued voice input and recording length
         master.title("ChatGPT-like Voice Chatbot (Mistral)")
         master.geometry("600x750") # Increased window height to accommodate more UI elements
 
-        self.recognizer = sr.Recognizer()
-        self.engine = pyttsx3.init()
-        self.ollama_client = Client()
+        # Speech, TTS and Ollama can be passed in (e.g. stubs for the memory soak test)
+        self.recognizer = recognizer or sr.Recognizer()
+        self.engine = engine or pyttsx3.init()
+        self.ollama_client = ollama_client or Client()
         self.voice_muted = False # Initialize voice mute state
 
         # --- Speech Rate Adjustment ---
@@ -28,8 +36,9 @@ class ChatbotUI:
             "Light Mode": {"bg": "white", "fg": "black", "button_bg": "#f0f0f0", "button_fg": "black", "input_bg": "white", "input_fg": "black"},
             "Dark Mode": {"bg": "#333333", "fg": "white", "button_bg": "#555555", "button_fg": "white", "input_bg": "#444444", "input_fg": "white"}
         }
-        self.current_theme = "Light Mode" # Default theme
-        self.set_theme(self.current_theme) # Apply initial theme
+        self.current_theme = "Light Mode" # Default theme, applied as the widgets are created below
+        self.user_color = "blue"
+        self.bot_color = "green"
 
         # --- Font ---
         self.default_font = ("Arial", 10)
@@ -64,38 +73,49 @@ class ChatbotUI:
         menubar.add_cascade(label="Voice", menu=self.voice_menu)
         self.populate_voice_menu() # Populate voice menu with available voices
 
+        # Diagnostics Menu (memory snapshots are only taken when enabled, e.g. in kiosk mode)
+        self.diagnostics = None
+        if caps.snapshot_interval:
+            self.diagnostics = MemoryDiagnostics()
+            self.diagnostics.start()
+            diagnostics_menu = Menu(menubar, tearoff=0)
+            diagnostics_menu.add_command(label="Memory Snapshot", command=self.show_memory_snapshot)
+            menubar.add_cascade(label="Diagnostics", menu=diagnostics_menu)
+            self.diagnostics.run_periodically(caps.snapshot_interval, self.log_memory_snapshot) # Off the Tk thread, so the UI doesn't freeze
+
         # Chat History Display
         self.chat_display = Text(master, wrap=WORD, state=tk.DISABLED, height=25, padx=10, pady=10, font=self.chat_font, bg=self.themes[self.current_theme]["bg"], fg=self.themes[self.current_theme]["fg"], insertbackground=self.themes[self.current_theme]["fg"])
         self.chat_display.pack(pady=10, padx=10, fill=BOTH, expand=True)
+        self.transcript = TranscriptLimiter(self.chat_display, caps.max_messages) # Drops the oldest messages past the cap
 
         # Font Control Frame
-        font_frame = Frame(master, bg=self.themes[self.current_theme]["bg"]) # Frame for font controls, themed
-        font_frame.pack(pady=(0, 5))
-        increase_font_button = Button(font_frame, text="+ Font", command=lambda: self.change_font_size(2), font=self.default_font, bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"])
+        self.font_frame = Frame(master, bg=self.themes[self.current_theme]["bg"]) # Frame for font controls, themed
+        self.font_frame.pack(pady=(0, 5))
+        increase_font_button = Button(self.font_frame, text="+ Font", command=lambda: self.change_font_size(2), font=self.default_font, bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"])
         increase_font_button.pack(side=LEFT, padx=5)
-        decrease_font_button = Button(font_frame, text="- Font", command=lambda: self.change_font_size(-2), font=self.default_font, bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"])
+        decrease_font_button = Button(self.font_frame, text="- Font", command=lambda: self.change_font_size(-2), font=self.default_font, bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"])
         decrease_font_button.pack(side=LEFT, padx=5)
 
         # Speech Rate Control Frame
-        rate_frame = Frame(master, bg=self.themes[self.current_theme]["bg"]) # Frame for rate control, themed
-        rate_frame.pack(pady=(0, 5))
-        rate_label = Label(rate_frame, text="Speech Rate:", font=self.default_font, bg=self.themes[self.current_theme]["bg"], fg=self.themes[self.current_theme]["fg"])
-        rate_label.pack(side=LEFT, padx=5)
-        self.rate_slider = Scale(rate_frame, from_=50, to=300, orient=HORIZONTAL, command=self.set_speech_rate, length=200, bg=self.themes[self.current_theme]["bg"], fg=self.themes[self.current_theme]["fg"], highlightbackground=self.themes[self.current_theme]["bg"]) # Themed slider
+        self.rate_frame = Frame(master, bg=self.themes[self.current_theme]["bg"]) # Frame for rate control, themed
+        self.rate_frame.pack(pady=(0, 5))
+        self.rate_label = Label(self.rate_frame, text="Speech Rate:", font=self.default_font, bg=self.themes[self.current_theme]["bg"], fg=self.themes[self.current_theme]["fg"])
+        self.rate_label.pack(side=LEFT, padx=5)
+        self.rate_slider = Scale(self.rate_frame, from_=50, to=300, orient=HORIZONTAL, command=self.set_speech_rate, length=200, bg=self.themes[self.current_theme]["bg"], fg=self.themes[self.current_theme]["fg"], highlightbackground=self.themes[self.current_theme]["bg"]) # Themed slider
         self.rate_slider.set(new_rate)
         self.rate_slider.pack(side=LEFT)
 
         # Input Frame
-        input_frame = Frame(master, bg=self.themes[self.current_theme]["bg"]) # Input frame themed
-        input_frame.pack(padx=10, pady=(0, 10), fill=X)
+        self.input_frame = Frame(master, bg=self.themes[self.current_theme]["bg"]) # Input frame themed
+        self.input_frame.pack(padx=10, pady=(0, 10), fill=X)
 
         # User Input Entry
-        self.user_input_entry = Entry(input_frame, font=self.default_font, bg=self.themes[self.current_theme]["input_bg"], fg=self.themes[self.current_theme]["input_fg"], insertbackground=self.themes[self.current_theme]["input_fg"]) # Themed input
+        self.user_input_entry = Entry(self.input_frame, font=self.default_font, bg=self.themes[self.current_theme]["input_bg"], fg=self.themes[self.current_theme]["input_fg"], insertbackground=self.themes[self.current_theme]["input_fg"]) # Themed input
         self.user_input_entry.pack(side=LEFT, padx=(0, 5), fill=X, expand=True)
         self.user_input_entry.bind("<Return>", self.send_message_event)
 
         # Send Button
-        self.send_button = Button(input_frame, text="Send", command=self.send_message, font=self.default_font, bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"]) # Themed button
+        self.send_button = Button(self.input_frame, text="Send", command=self.send_message, font=self.default_font, bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"]) # Themed button
         self.send_button.pack(side=LEFT)
 
         # Voice Input Button
@@ -110,6 +130,9 @@ class ChatbotUI:
         self.mute_button = Button(master, text="Mute Voice", command=self.toggle_mute_voice, font=self.default_font, bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"]) # Themed button
         self.mute_button.pack(pady=(0, 10))
 
+        # Voice input requests are handled one at a time by a single worker thread
+        self.voice_jobs = queue.Queue(maxsize=caps.max_pending_jobs)
+        threading.Thread(target=self.voice_worker, daemon=True).start()
 
         self.add_bot_message("Voice Chatbot Started! (Mistral Model)")
         self.speak_response("Voice Chatbot Started! Using Mistral Model")
@@ -131,13 +154,29 @@ class ChatbotUI:
         font_frame_bg = bg_color # Frame background same as main background
         rate_frame_bg = bg_color
         input_frame_bg = bg_color
-        font_frame.config(bg=font_frame_bg)
-        rate_frame.config(bg=rate_frame_bg)
-        input_frame.config(bg=input_frame_bg)
-        rate_label.config(bg=rate_frame_bg, fg=fg_color) # Themed label
+        self.font_frame.config(bg=font_frame_bg)
+        self.rate_frame.config(bg=rate_frame_bg)
+        self.input_frame.config(bg=input_frame_bg)
+        self.rate_label.config(bg=rate_frame_bg, fg=fg_color) # Themed label
         self.rate_slider.config(bg=rate_frame_bg, fg=fg_color, highlightbackground=rate_frame_bg) # Themed slider
 
 
+    def choose_user_color(self):
+        """Lets the user pick the color of their own messages."""
+        color = colorchooser.askcolor(color=self.user_color, title="User Message Color")[1]
+        if color:
+            self.user_color = color
+            self.chat_display.tag_config("user_label", foreground=color)
+            self.chat_display.tag_config("user_message", foreground=color)
+
+    def choose_bot_color(self):
+        """Lets the user pick the color of the chatbot's messages."""
+        color = colorchooser.askcolor(color=self.bot_color, title="Chatbot Message Color")[1]
+        if color:
+            self.bot_color = color
+            self.chat_display.tag_config("bot_label", foreground=color)
+            self.chat_display.tag_config("bot_message", foreground=color)
+
     def change_font_size(self, size_change):
         """Changes the font size of chat and input text."""
         current_font = self.chat_font.actual() # Get actual font properties as dict
@@ -181,6 +220,7 @@ class ChatbotUI:
     def clear_chat_history(self):
         """Clears the chat display."""
         self.chat_display.config(state=tk.NORMAL)
+        self.transcript.clear()
         self.chat_display.delete(1.0, END)
         self.chat_display.config(state=tk.DISABLED)
         self.add_bot_message("Chat history cleared.")
@@ -206,6 +246,7 @@ class ChatbotUI:
         if filepath:
             try:
                 self.chat_display.config(state=tk.NORMAL)
+                self.transcript.clear()
                 self.chat_display.delete(1.0, END)
                 with open(filepath, "r", encoding="utf-8") as f:
                     loaded_chat_log = f.read()
@@ -226,6 +267,7 @@ class ChatbotUI:
     def add_message(self, sender, message, is_bot_message=False):
         """Adds a message to the chat display with formatting and Copy button."""
         self.chat_display.config(state=tk.NORMAL)
+        self.transcript.begin_message()
         if is_bot_message:
             self.chat_display.insert(END, f"Chatbot: ", "bot_label")
         else:
@@ -238,19 +280,20 @@ class ChatbotUI:
         message_end_index = self.chat_display.index(END)
 
         if is_bot_message:
-            self.chat_display.tag_config("bot_label", foreground="green", font=("Arial", 10, "bold"))
+            self.chat_display.tag_config("bot_label", foreground=self.bot_color, font=("Arial", 10, "bold"))
             self.chat_display.tag_add("bot_message", message_start_index, message_end_index)
-            self.chat_display.tag_config("bot_message", foreground="green")
+            self.chat_display.tag_config("bot_message", foreground=self.bot_color)
             copy_button = Button(self.chat_display, text="Copy", font=("Arial", 8),
                                  command=lambda msg=message: self.copy_to_clipboard(msg), bg=self.themes[self.current_theme]["button_bg"], fg=self.themes[self.current_theme]["button_fg"], activebackground=self.themes[self.current_theme]["button_bg"], activeforeground=self.themes[self.current_theme]["button_fg"]) # Themed button
-            self.chat_display.window_create(END, window=copy_button)
+            self.transcript.embed(copy_button) # Destroyed when the message is trimmed or cleared
             self.chat_display.insert(END, "\n")
 
         else:
-            self.chat_display.tag_config("user_label", foreground="blue", font=("Arial", 10, "bold"))
-            self.chat_display.tag_config("user_message", foreground="blue")
+            self.chat_display.tag_config("user_label", foreground=self.user_color, font=("Arial", 10, "bold"))
+            self.chat_display.tag_config("user_message", foreground=self.user_color)
             self.chat_display.tag_add("user_message", message_start_index, message_end_index)
 
+        self.transcript.trim()
         self.chat_display.config(state=tk.DISABLED)
         self.chat_display.see(END)
 
@@ -299,7 +342,12 @@ class ChatbotUI:
             print("Listening for voice input...")
             self.add_bot_message("Listening for voice input...")
             self.recognizer.adjust_for_ambient_noise(source)
-            audio = self.recognizer.listen(source)
+            try:
+                audio = self.recognizer.listen(source, timeout=10, phrase_time_limit=self.caps.max_phrase_seconds)
+            except sr.WaitTimeoutError:
+                print("No speech heard")
+                self.add_bot_message("No speech heard. Click Voice Input to try again.")
+                return ""
         try:
             self.add_bot_message("Recognizing...")
             print(f"Recognizing voice input...")
@@ -324,9 +372,32 @@ class ChatbotUI:
             self.add_bot_message(bot_response_text)
             self.speak_response(bot_response_text)
 
+    def voice_worker(self):
+        """Handles queued voice input requests one at a time (in thread)."""
+        while True:
+            self.voice_jobs.get()
+            try:
+                self.process_voice_input()
+            except Exception as e:
+                # Keep the worker alive (e.g. no microphone, or TTS busy) so later clicks still work
+                print(f"Voice input error: {e}")
+                self.add_bot_message("Sorry, voice input failed. Please try again.")
+
     def start_voice_input(self):
-        """Starts voice input in a separate thread."""
-        threading.Thread(target=self.process_voice_input, daemon=True).start()
+        """Queues a voice input request for the worker thread."""
+        try:
+            self.voice_jobs.put_nowait(None)
+        except queue.Full:
+            print("Voice input already pending, ignoring click")
+            self.add_bot_message("Still working on your last voice input, please wait.")
+
+    def log_memory_snapshot(self, report):
+        """Prints a periodic memory snapshot to the console (on the diagnostics thread)."""
+        print(format_report(report))
+
+    def show_memory_snapshot(self):
+        """Shows a fresh memory snapshot in a dialog."""
+        messagebox.showinfo("Memory Snapshot", format_report(self.diagnostics.snapshot()))
 
     def copy_to_clipboard(self, text_to_copy):
         """Copies text to the clipboard."""
@@ -334,8 +405,19 @@ class ChatbotUI:
         print("Chatbot response copied to clipboard!")  # Optional feedback
 
 def main():
+    parser = argparse.ArgumentParser(description="ChatGPT-like voice chatbot (Mistral)")
+    parser.add_argument("--kiosk", action="store_true", help="cap memory use for all-day sessions and log memory snapshots")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = start_profiling(args, "MistralAdvBot")
+    if profiler:
+        profiler.instrument(ChatbotUI, {"add_message": "tk.add_message", "set_theme": "tk.set_theme", "recognize_speech": "stt",
+                                        "generate_response": "llm", "speak_response": "tts"})
+
     root = tk.Tk()
-    chatbot_ui = ChatbotUI(root)
+    if profiler:
+        profiler.watch_tk(root)
+    chatbot_ui = ChatbotUI(root, caps=KIOSK_CAPS if args.kiosk else DEFAULT_CAPS)
     tk.font.nametofont("TkDefaultFont").configure(family="Arial", size=10) # Set default font for Tkinter
     root.mainloop()
 
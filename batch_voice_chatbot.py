@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import speech_recognition as sr
+from ollama import Client
+
+from profiling import add_profile_arguments, start_profiling
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+REPLY_SUFFIX = ".reply.wav"  # Spoken replies rendered by --speak-dir
+
+# One recognizer per worker process, created on first use
+_recognizer = None
+
+
+def transcribe_file(path):
+    """Decodes and recognizes one audio file (runs in a worker process)."""
+    global _recognizer
+    if _recognizer is None:
+        _recognizer = sr.Recognizer()
+    result = {"transcript": "", "error": None}
+    start = time.perf_counter()
+    try:
+        with sr.AudioFile(path) as source:
+            audio = _recognizer.record(source)
+        decoded = time.perf_counter()
+        result["decode"] = decoded - start
+        try:
+            result["transcript"] = _recognizer.recognize_google(audio).lower()
+        except sr.UnknownValueError:
+            result["error"] = "Could not understand audio"
+        except sr.RequestError as e:
+            result["error"] = f"Speech recognition error; {e}"
+        result["stt"] = time.perf_counter() - decoded
+    except (ValueError, OSError, EOFError) as e:
+        result["error"] = f"Could not decode audio; {e}"
+        result["decode"] = time.perf_counter() - start
+    return result
+
+
+def _timed(func, *args):
+    """Calls func and returns (result, seconds), timed on the thread that runs it."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def find_audio_files(input_dir):
+    """Returns the WAV/FLAC files in a directory, sorted by name.
+
+    Rendered replies are skipped, so a --speak-dir inside the input directory
+    doesn't get its own replies answered on the next run.
+    """
+    return sorted(
+        name for name in os.listdir(input_dir)
+        if name.lower().endswith(AUDIO_EXTENSIONS) and not name.lower().endswith(REPLY_SUFFIX)
+        and os.path.isfile(os.path.join(input_dir, name))
+    )
+
+
+def load_completed(output_path):
+    """Returns the files already answered successfully in an earlier run."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Line cut short by an interrupted run
+            if record.get("status") == "ok":
+                completed.add(record["file"])
+    return completed
+
+
+class BatchChatbot:
+    """Transcribes a folder of recordings and answers each one with Ollama."""
+
+    def __init__(self, input_dir, output_path, model="llama3.2:latest", workers=None, llm_concurrency=2, speak_dir=None):
+        self.input_dir = input_dir
+        self.output_path = output_path
+        self.model = model
+        self.workers = workers or os.cpu_count() or 1
+        self.llm_concurrency = llm_concurrency
+        self.speak_dir = speak_dir
+        self.ollama_client = Client()
+        self._engine = None
+        self._done = 0
+
+    def generate_response(self, user_input):
+        """Generates a reply using Ollama (raises on failure so the file is retried next run)."""
+        response = self.ollama_client.chat(
+            model=self.model,
+            messages=[{'role': 'user', 'content': user_input}]
+        )
+        return response['message']['content']
+
+    def render_reply(self, text, path):
+        """Renders a spoken reply to an audio file (always on the TTS thread)."""
+        if self._engine is None:
+            import pyttsx3
+            self._engine = pyttsx3.init()
+        self._engine.save_to_file(text, path)
+        self._engine.runAndWait()
+
+    async def process_file(self, name, stt_pool, llm_pool, tts_pool, output, total):
+        """Runs one file through STT, the model and (optionally) TTS, then records the result."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        record = {"file": name, "status": "error", "transcript": "", "reply": None, "reply_audio": None, "error": None}
+        timings = {}
+
+        stt = await loop.run_in_executor(stt_pool, transcribe_file, os.path.join(self.input_dir, name))
+        record["transcript"] = stt["transcript"]
+        record["error"] = stt["error"]
+        timings["decode"] = stt.get("decode", 0.0)
+        timings["stt"] = stt.get("stt", 0.0)
+
+        if record["transcript"]:
+            try:
+                # Timed inside the pools so waiting for a free slot isn't counted as work
+                record["reply"], timings["llm"] = await loop.run_in_executor(llm_pool, _timed, self.generate_response, record["transcript"])
+                if self.speak_dir:
+                    reply_audio = os.path.join(self.speak_dir, name + REPLY_SUFFIX)
+                    _, timings["tts"] = await loop.run_in_executor(tts_pool, _timed, self.render_reply, record["reply"], reply_audio)
+                    record["reply_audio"] = reply_audio
+                record["status"] = "ok"
+            except Exception as e:
+                record["error"] = f"Error from Ollama or TTS: {e}"
+        elif record["error"] == "Could not understand audio":
+            record["status"] = "ok"  # Nothing to answer; retrying won't change that
+
+        timings["total"] = time.perf_counter() - start
+        record["timings"] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+        # One flushed line per file, so an interrupted run loses only the files in flight
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+        self._done += 1
+        print(f"[{self._done}/{total}] {name}: {record['status']} ({timings['total']:.2f}s)")
+        return record
+
+    async def run(self):
+        """Processes every file that hasn't been completed yet and returns a summary."""
+        files = find_audio_files(self.input_dir)
+        completed = load_completed(self.output_path)
+        pending = [name for name in files if name not in completed]
+        print(f"{len(files)} audio files, {len(files) - len(pending)} already done, {len(pending)} to process")
+        if self.speak_dir:
+            os.makedirs(self.speak_dir, exist_ok=True)
+
+        start = time.perf_counter()
+        # Spawned, not forked: a forked worker would inherit a --profile parent's cProfile hook
+        # (sys.setprofile on 3.11, sys.monitoring on 3.12+) and skew the per-file timings
+        stt_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=stt_context) as stt_pool, \
+                ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="batch-llm") as llm_pool, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-tts") as tts_pool, \
+                open(self.output_path, "a", encoding="utf-8") as output:
+            records = await asyncio.gather(*(self.process_file(name, stt_pool, llm_pool, tts_pool, output, len(pending)) for name in pending))
+        elapsed = time.perf_counter() - start
+
+        succeeded = sum(1 for record in records if record["status"] == "ok")
+        summary = {
+            "processed": len(records),
+            "succeeded": succeeded,
+            "failed": len(records) - succeeded,
+            "seconds": round(elapsed, 3),
+            "files_per_second": round(len(records) / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+        print(f"Processed {summary['processed']} files ({summary['failed']} failed) in {elapsed:.1f}s: {summary['files_per_second']} files/s")
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a folder of WAV/FLAC recordings and answer them with Ollama.")
+    parser.add_argument("input_dir", help="directory of .wav/.flac recordings")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL results file (appended to, used to resume)")
+    parser.add_argument("--model", default="llama3.2:latest", help="Ollama model to answer with")
+    parser.add_argument("--workers", type=int, default=None, help="speech recognition processes (default: number of cores)")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="Ollama requests in flight at once")
+    parser.add_argument("--speak-dir", default=None, help="render spoken replies as .wav files into this directory")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = start_profiling(args, "batch_voice_chatbot")
+    if profiler:
+        # Recognition runs in worker processes, so its time shows up in the per-file timings instead
+        profiler.instrument(BatchChatbot, {"generate_response": "llm", "render_reply": "tts"})
+
+    batch = BatchChatbot(args.input_dir, args.output, model=args.model, workers=args.workers,
+                         llm_concurrency=args.llm_concurrency, speak_dir=args.speak_dir)
+    try:
+        asyncio.run(batch.run())
+    except KeyboardInterrupt:
+        print("Interrupted. Run the same command again to resume.")
+
+if __name__ == "__main__":
+    main()
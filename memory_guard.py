@@ -0,0 +1,351 @@
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+try:
+    import psutil  # Optional, gives current RSS on every platform
+except ImportError:
+    psutil = None
+
+
+class ResourceCaps:
+    """Hard limits on what a long-running session is allowed to accumulate."""
+
+    def __init__(self, max_messages=None, max_pending_jobs=4, max_queued_audio=2, max_phrase_seconds=None, snapshot_interval=None):
+        if max_messages is not None and max_messages < 1:
+            raise ValueError("max_messages must be at least 1 (or None for unlimited)")
+        self.max_messages = max_messages              # Messages kept in the chat display (None = unlimited)
+        self.max_pending_jobs = max_pending_jobs      # Voice input requests waiting for the worker
+        self.max_queued_audio = max_queued_audio      # Utterances waiting between pipeline stages
+        self.max_phrase_seconds = max_phrase_seconds  # Longest single recording (None = unlimited)
+        self.snapshot_interval = snapshot_interval    # Seconds between memory snapshots (None = off)
+
+
+DEFAULT_CAPS = ResourceCaps()
+KIOSK_CAPS = ResourceCaps(max_messages=200, max_pending_jobs=1, max_queued_audio=1, max_phrase_seconds=15, snapshot_interval=600)
+
+
+def current_rss():
+    """Returns the resident set size of this process in bytes (None if unknown)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _megabytes(num_bytes):
+    return "unknown" if num_bytes is None else f"{num_bytes / (1024 * 1024):.1f} MB"
+
+
+class TranscriptLimiter:
+    """Keeps a Text widget down to its newest max_messages messages.
+
+    Each message is remembered as a mark at its first character together with
+    the widgets embedded in it (the Copy buttons). Trimming destroys those
+    widgets along with the text, so neither the Text contents nor the
+    widget's children keep growing.
+    """
+
+    def __init__(self, text_widget, max_messages=None):
+        if max_messages is not None and max_messages < 1:
+            raise ValueError("max_messages must be at least 1 (or None for unlimited)")
+        self.text_widget = text_widget
+        self.max_messages = max_messages
+        self._messages = deque()  # (mark name, [embedded widgets]) oldest first
+        self._next_id = 0
+
+    def begin_message(self):
+        """Marks the end of the widget as the start of a new message."""
+        mark = f"message{self._next_id}"
+        self._next_id += 1
+        self.text_widget.mark_set(mark, "end-1c")
+        self.text_widget.mark_gravity(mark, "left")  # Stay in front of the text inserted after it
+        self._messages.append((mark, []))
+
+    def embed(self, widget):
+        """Embeds a widget at the end of the current message."""
+        self.text_widget.window_create("end", window=widget)
+        self._messages[-1][1].append(widget)
+
+    def trim(self):
+        """Drops the oldest messages beyond the cap. The widget must be editable."""
+        if self.max_messages is None:
+            return
+        while len(self._messages) > self.max_messages:
+            mark, widgets = self._messages.popleft()
+            self.text_widget.delete("1.0", self._messages[0][0])
+            self.text_widget.mark_unset(mark)
+            for widget in widgets:
+                widget.destroy()
+
+    def clear(self):
+        """Forgets every message and destroys their embedded widgets."""
+        while self._messages:
+            mark, widgets = self._messages.popleft()
+            self.text_widget.mark_unset(mark)
+            for widget in widgets:
+                widget.destroy()
+
+
+class MemoryDiagnostics:
+    """Takes periodic tracemalloc snapshots and compares them to the first one."""
+
+    def __init__(self, top=10, history=24):
+        self.top = top
+        self.reports = deque(maxlen=history)
+        self._baseline = None
+        self._stop = threading.Event()
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    def start(self):
+        """Starts tracing allocations and records the baseline snapshot."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._baseline = self._take_snapshot()
+
+    def snapshot(self):
+        """Takes a snapshot and returns a report of memory use and its growth."""
+        if self._baseline is None:
+            self.start()
+        snapshot = self._take_snapshot()
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        growth = snapshot.compare_to(self._baseline, "lineno")[:self.top]
+        report = {
+            "time": time.time(),
+            "rss": current_rss(),
+            "traced": traced,
+            "traced_peak": traced_peak,
+            "top_growth": [str(stat) for stat in growth if stat.size_diff > 0],
+        }
+        self.reports.append(report)
+        return report
+
+    def latest(self):
+        """Returns the most recent report, taking one if there is none yet."""
+        return self.reports[-1] if self.reports else self.snapshot()
+
+    def run_periodically(self, interval, callback=None):
+        """Takes a snapshot every `interval` seconds on a background thread."""
+        def loop():
+            while not self._stop.wait(interval):
+                report = self.snapshot()
+                if callback:
+                    callback(report)
+        self._stop.clear()
+        threading.Thread(target=loop, name="memory-diagnostics", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def format_report(report):
+    """Formats a snapshot report for the console or a dialog."""
+    lines = [
+        f"Memory at {time.strftime('%H:%M:%S', time.localtime(report['time']))}: "
+        f"RSS {_megabytes(report['rss'])}, traced {_megabytes(report['traced'])} (peak {_megabytes(report['traced_peak'])})"
+    ]
+    if report["top_growth"]:
+        lines.append("Largest growth since start:")
+        lines.extend(f"  {line}" for line in report["top_growth"])
+    return "\n".join(lines)
+
+
+def _soak_pipeline(turns, samples):
+    """Drives the CLI pipeline through `turns` turns with stub STT, LLM and TTS."""
+    import asyncio
+    from voice_pipeline import VoicePipeline
+
+    captured = iter(range(1, turns + 1))
+    heard = iter(range(1, turns + 1))
+    sample_every = max(1, turns // 20)
+    earlier_turns_done = threading.Event()
+
+    def capture():
+        if next(captured, None) is None:
+            time.sleep(0.01)  # Like a listen timing out once every turn has been captured
+            return None
+        return bytearray(32000)  # About a second of 16 kHz 16-bit audio
+
+    def transcribe(audio):
+        turn = next(heard)
+        if turn < turns:
+            return f"question number {turn}"
+        # Let every earlier turn finish first, so none is cut off by the exit word
+        earlier_turns_done.wait()
+        return "goodbye"
+
+    def generate(text):
+        return f"This is the answer to {text}. " * 20
+
+    def speak(text):
+        pass
+
+    def on_turn(timings):
+        if timings.turn_id % sample_every == 0:
+            samples.append(current_rss())
+        if pipeline.turn_count == turns - 1:
+            earlier_turns_done.set()
+
+    pipeline = VoicePipeline(capture, transcribe, generate, speak, queue_size=KIOSK_CAPS.max_queued_audio, half_duplex=False, verbose=False, on_turn=on_turn)
+    if turns <= 1:
+        earlier_turns_done.set()
+    asyncio.run(pipeline.run())
+    return pipeline.turn_count
+
+
+class _StubEngine:
+    """Stands in for the pyttsx3 engine."""
+
+    def getProperty(self, name):
+        return {"rate": 200, "voices": []}[name]
+
+    def setProperty(self, name, value):
+        pass
+
+    def say(self, text):
+        pass
+
+    def runAndWait(self):
+        pass
+
+
+class _StubOllama:
+    """Stands in for the Ollama client."""
+
+    def chat(self, model, messages):
+        return {"message": {"content": f"This is the answer to {messages[-1]['content']}. " * 20}}
+
+
+def _soak_chat_display(turns, samples):
+    """Drives MistralAdvBot's real ChatbotUI through `turns` voice turns with stub STT, LLM and TTS.
+
+    Returns the number of turns driven, or None if the UI couldn't be created.
+    Tk needs a display; on a headless machine run the soak under Xvfb
+    (`xvfb-run python memory_guard.py`).
+    """
+    import tkinter as tk
+
+    try:
+        from MistralAdvBot import ChatbotUI
+    except ImportError as e:
+        print(f"Chat display soak can't run, MistralAdvBot's dependencies are missing: {e}")
+        return None
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Chat display soak can't run without a display ({e}). Run it under Xvfb: xvfb-run python memory_guard.py")
+        return None
+    root.withdraw()
+
+    turn_done = threading.Event()
+
+    class SoakChatbotUI(ChatbotUI):
+        soak_turn = 0
+
+        def recognize_speech(self):
+            """Stub STT: 'hears' the next question instead of using the microphone."""
+            self.soak_turn += 1
+            text = f"question number {self.soak_turn}"
+            self.add_user_message(text)
+            return text
+
+        def process_voice_input(self):
+            try:
+                super().process_voice_input()
+            finally:
+                turn_done.set()
+
+    caps = ResourceCaps(max_messages=KIOSK_CAPS.max_messages, max_pending_jobs=KIOSK_CAPS.max_pending_jobs,
+                        max_queued_audio=KIOSK_CAPS.max_queued_audio, max_phrase_seconds=KIOSK_CAPS.max_phrase_seconds)
+    ui = SoakChatbotUI(root, caps=caps, engine=_StubEngine(), ollama_client=_StubOllama())
+    sample_every = max(1, turns // 20)
+    started = 0
+
+    def next_turn():
+        nonlocal started
+        if started and started % sample_every == 0:
+            samples.append(current_rss())
+        if started == turns:
+            root.quit()
+            return
+        started += 1
+        turn_done.clear()
+        # Same path as a click: the bounded job queue, the voice worker thread, then
+        # the real add_message, Copy buttons and trimming
+        ui.start_voice_input()
+        root.after(1, wait_for_turn)
+
+    def wait_for_turn():
+        # The worker updates the chat through Tk, so the main loop has to keep running meanwhile
+        if turn_done.is_set():
+            next_turn()
+        else:
+            root.after(1, wait_for_turn)
+
+    root.after_idle(next_turn)
+    root.mainloop()
+    root.destroy()
+    return ui.soak_turn
+
+
+def _is_flat(samples, tolerance):
+    """True if RSS after the warm-up fifth of the samples grew by less than `tolerance` bytes."""
+    samples = [sample for sample in samples if sample is not None]
+    if len(samples) < 5:
+        return True
+    warm = samples[len(samples) // 5:]
+    growth = warm[-1] - min(warm)
+    print(f"  RSS {_megabytes(warm[0])} -> {_megabytes(warm[-1])} (growth {_megabytes(growth)})")
+    return growth < tolerance
+
+
+def run_soak(turns=5000, tolerance_mb=8):
+    """Runs thousands of simulated turns headlessly and checks RSS stays flat."""
+    if current_rss() is None:
+        print("Can't read RSS on this platform (install psutil), soak test skipped.")
+        return True
+    diagnostics = MemoryDiagnostics()
+    diagnostics.start()
+    tolerance = tolerance_mb * 1024 * 1024
+    ok = True
+
+    samples = []
+    done = _soak_pipeline(turns, samples)
+    print(f"Pipeline soak: {done} turns")
+    ok &= done == turns and _is_flat(samples, tolerance)
+
+    samples = []
+    done = _soak_chat_display(turns, samples)
+    if done is None:
+        ok = False  # Not covering the chat display is a failure, not a pass
+    else:
+        print(f"Chat display soak: {done} turns")
+        ok &= done == turns and _is_flat(samples, tolerance)
+
+    print(format_report(diagnostics.snapshot()))
+    print("Soak test passed: memory stayed flat." if ok else "Soak test FAILED: memory kept growing or part of it couldn't run.")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory soak test for long-running chatbot sessions.")
+    parser.add_argument("--turns", type=int, default=5000, help="number of simulated turns")
+    parser.add_argument("--tolerance-mb", type=float, default=8, help="allowed RSS growth after warm-up")
+    args = parser.parse_args()
+    sys.exit(0 if run_soak(args.turns, args.tolerance_mb) else 1)
+
+if __name__ == "__main__":
+    main()
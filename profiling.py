@@ -0,0 +1,283 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+# Ctrl+Break on Windows, Ctrl+\ on Unix terminals
+HOTKEY_SIGNAL = getattr(signal, "SIGBREAK", None) or getattr(signal, "SIGQUIT", None)
+TK_HOTKEY = "<F12>"
+
+
+class StageStats:
+    """Wall-clock and CPU time spent in one pipeline stage."""
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.wall_max = 0.0
+        self.cpu = 0.0
+
+    def add(self, wall, cpu):
+        self.calls += 1
+        self.wall += wall
+        self.wall_max = max(self.wall_max, wall)
+        self.cpu += cpu
+
+
+class LagStats:
+    """How late scheduled Tk `after` callbacks actually ran."""
+
+    def __init__(self, threshold, history=10000):
+        self.threshold = threshold
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=history)  # Recent lags only, so long sessions stay bounded
+        self.stalls = Counter()  # Stage that finished just before a stall -> count
+
+    def add(self, lag):
+        self.count += 1
+        self.total += lag
+        self.max = max(self.max, lag)
+        self.samples.append(lag)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Profiler:
+    """Opt-in profiling for the chatbot front-ends.
+
+    Combines three views that can be dumped at exit or on a hotkey:
+    - per-stage wall/CPU time from the hooks around STT, LLM, TTS and UI work,
+    - a sampling profiler over every thread, written as speedscope JSON with
+      the active stage as the root frame of each sample,
+    - cProfile, written as pstats. Before Python 3.12 it covers only the
+      thread that started it (the Tk or asyncio event loop); from 3.12 on it
+      records every thread.
+    For Tk front-ends it also measures event-loop lag from `after` jitter.
+    """
+
+    def __init__(self, name, output_dir="profiles", interval=0.005, tk_interval_ms=50, lag_threshold=0.1):
+        self.name = name
+        self.output_dir = output_dir
+        self.interval = interval
+        self.tk_interval_ms = tk_interval_ms
+
+        self.stages = {}        # stage name -> StageStats
+        self.lag = LagStats(lag_threshold)
+        self.thread_cpu = {}    # thread name -> CPU seconds, last seen by the sampler
+        self._active = {}       # thread ident -> stage currently running on it
+        self._last_main_stage = (None, 0.0)  # (stage, end time) of the last stage run on the main thread
+        self._lock = threading.RLock()  # Re-entrant: the hotkey signal handler may interrupt a locked section
+
+        self._frames = {}       # (name, file, line) -> index into the speedscope frame table
+        self._samples = {}      # thread name -> Counter of stacks (tuples of frame indices, root first)
+        self._started = time.perf_counter()
+        self._stop = threading.Event()
+        self._cprofile = cProfile.Profile()
+        self._dumps = 0
+
+    def start(self):
+        """Starts cProfile, the sampler, the hotkey and the exit dump (call from the main thread)."""
+        self._cprofile.enable()
+        threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True).start()
+        if HOTKEY_SIGNAL is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(HOTKEY_SIGNAL, lambda signum, frame: self.dump("hotkey"))
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """Stops sampling and writes the final profile (safe to call twice)."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self.dump("exit")
+
+    # --- Stage hooks ---
+
+    def stage(self, name, func):
+        """Wraps func so every call is timed and attributed to the named stage."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ident = threading.get_ident()
+            previous = self._active.get(ident)
+            self._active[ident] = name
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall_end = time.perf_counter()
+                cpu_end = time.thread_time()
+                with self._lock:
+                    self.stages.setdefault(name, StageStats()).add(wall_end - wall_start, cpu_end - cpu_start)
+                    # Also works on Windows and for short-lived threads the sampler may miss
+                    self.thread_cpu[threading.current_thread().name] = cpu_end
+                if previous is None:
+                    self._active.pop(ident, None)
+                else:
+                    self._active[ident] = previous
+                if threading.current_thread() is threading.main_thread():
+                    self._last_main_stage = (name, wall_end)
+        return wrapper
+
+    def instrument(self, cls, stages):
+        """Wraps methods of a class in place, e.g. {"add_message": "tk.add_message"}."""
+        for method, stage in stages.items():
+            setattr(cls, method, self.stage(stage, getattr(cls, method)))
+
+    # --- Tk event loop lag ---
+
+    def watch_tk(self, root):
+        """Measures `after` jitter on a Tk root and binds the dump hotkey."""
+        interval = self.tk_interval_ms / 1000
+
+        def tick(expected):
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self.lag.add(lag)
+            if lag >= self.lag.threshold:
+                stage, ended = self._last_main_stage
+                # Blame the main-thread stage that finished while the loop was stalled
+                self.lag.stalls[stage if stage and ended >= expected - interval else "untracked"] += 1
+            if not self._stop.is_set():
+                root.after(self.tk_interval_ms, tick, time.perf_counter() + interval)
+
+        root.after(self.tk_interval_ms, tick, time.perf_counter() + interval)
+        root.bind_all(TK_HOTKEY, lambda event: self.dump("hotkey"))
+
+    # --- Sampling ---
+
+    def _frame_index(self, code):
+        key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def _stage_index(self, stage):
+        key = (f"[stage] {stage}", "", 0)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        next_cpu_check = 0.0
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self._lock:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._frame_index(frame.f_code))
+                        frame = frame.f_back
+                    stage = self._active.get(ident)
+                    if stage:
+                        stack.append(self._stage_index(stage))
+                    stack.reverse()
+                    self._samples.setdefault(names.get(ident, str(ident)), Counter())[tuple(stack)] += 1
+            if time.perf_counter() >= next_cpu_check:
+                self._read_thread_cpu()
+                next_cpu_check = time.perf_counter() + 1.0
+
+    def _read_thread_cpu(self):
+        """Records the CPU time of every live thread (where the platform allows it)."""
+        if not hasattr(time, "pthread_getcpuclockid"):
+            return  # Windows: only the CPU times recorded by the stage hooks
+        for thread in threading.enumerate():
+            try:
+                self.thread_cpu[thread.name] = time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+            except (OSError, TypeError):
+                pass  # Thread exited between enumerate() and the clock lookup
+
+    # --- Output ---
+
+    def _speedscope(self):
+        frames = [{"name": name, "file": file, "line": line} for (name, file, line), _ in sorted(self._frames.items(), key=lambda item: item[1])]
+        profiles = []
+        for thread_name, stacks in self._samples.items():
+            samples = list(stacks.keys())
+            weights = [count * self.interval for count in stacks.values()]
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": [list(stack) for stack in samples],
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "profiling.py",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def summary(self):
+        """Returns a plain-text report of stage times, thread CPU and Tk lag."""
+        elapsed = time.perf_counter() - self._started
+        lines = [f"Profile of {self.name} after {elapsed:.1f}s", "", "Stage                 calls    wall(s)   max(s)    cpu(s)"]
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1].wall):
+            lines.append(f"{name:<20} {stats.calls:>6} {stats.wall:>10.3f} {stats.wall_max:>8.3f} {stats.cpu:>9.3f}")
+        if self.thread_cpu:
+            lines += ["", "Thread CPU time (s)"]
+            lines += [f"  {name:<30} {cpu:.3f}" for name, cpu in sorted(self.thread_cpu.items(), key=lambda item: -item[1])]
+        if self.lag.count:
+            lines += ["", f"Tk event loop lag: mean {self.lag.total / self.lag.count * 1000:.1f}ms, "
+                          f"p95 {self.lag.percentile(0.95) * 1000:.1f}ms (recent), max {self.lag.max * 1000:.1f}ms"]
+            if self.lag.stalls:
+                lines.append(f"Stalls over {self.lag.threshold * 1000:.0f}ms, by the stage that caused them:")
+                lines += [f"  {stage:<20} {count}" for stage, count in self.lag.stalls.most_common()]
+        return "\n".join(lines)
+
+    def dump(self, reason="hotkey"):
+        """Writes pstats, speedscope JSON and a summary into the output directory."""
+        self._read_thread_cpu()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._dumps += 1
+        base = os.path.join(self.output_dir, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{self._dumps}")
+
+        # cProfile can only be dumped while disabled; carry on afterwards unless we're exiting
+        self._cprofile.disable()
+        self._cprofile.dump_stats(base + ".pstats")
+        if not self._stop.is_set():
+            self._cprofile.enable()
+
+        with self._lock:
+            speedscope = self._speedscope()
+        with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+            json.dump(speedscope, f)
+        summary = self.summary()
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(summary + "\n")
+        print(f"\n{summary}\nProfile ({reason}) written to {base}.pstats / .speedscope.json / .txt")
+
+
+def add_profile_arguments(parser):
+    """Adds the --profile options shared by every entry point."""
+    parser.add_argument("--profile", action="store_true",
+                        help="profile stages, threads and UI lag; dump at exit or on the hotkey (F12 in the UI, Ctrl+Break/Ctrl+\\ in a terminal)")
+    parser.add_argument("--profile-dir", default="profiles", help="where --profile writes .pstats and speedscope .json files")
+
+
+def start_profiling(args, name):
+    """Returns a started Profiler if --profile was given, otherwise None."""
+    if not args.profile:
+        return None
+    return Profiler(name, output_dir=args.profile_dir).start()
@@ -0,0 +1,244 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+EXIT_WORDS = ("bye", "exit", "goodbye")
+
+
+def is_exit_command(text):
+    """Returns True if the transcript contains one of the exit words."""
+    return any(word in text for word in EXIT_WORDS)
+
+
+class TurnTimings:
+    """Start/end times of every stage a single turn went through."""
+
+    def __init__(self, turn_id):
+        self.turn_id = turn_id
+        self.stages = {}  # stage name -> (start, end) from time.perf_counter()
+
+    def record(self, stage, start, end):
+        self.stages[stage] = (start, end)
+
+    def duration(self, stage):
+        start, end = self.stages.get(stage, (0.0, 0.0))
+        return end - start
+
+    def latency(self):
+        """Wall time from the start of capture to the end of the last stage."""
+        starts = [start for start, _ in self.stages.values()]
+        ends = [end for _, end in self.stages.values()]
+        return max(ends) - min(starts) if starts else 0.0
+
+
+class StageWorker:
+    """Runs one stage's blocking calls, one at a time, on a daemon thread.
+
+    Unlike a ThreadPoolExecutor, whose threads are joined at interpreter exit,
+    a call still in progress (a model reply, a mic listen) can't keep the
+    process alive after the pipeline has been told to stop.
+    """
+
+    def __init__(self, name):
+        self._jobs = queue.SimpleQueue()
+        threading.Thread(target=self._loop, name=name, daemon=True).start()
+
+    def submit(self, func, *args):
+        future = Future()
+        self._jobs.put((future, func, args))
+        return future
+
+    def shutdown(self):
+        self._jobs.put(None)
+
+    def _loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            future, func, args = job
+            if not future.set_running_or_notify_cancel():
+                continue  # Cancelled while it was still queued
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class VoicePipeline:
+    """Runs capture, STT, LLM and TTS as separate asyncio tasks.
+
+    The stages are joined by bounded queues, so a slow stage holds back the
+    ones feeding it (backpressure) instead of letting work pile up. Every
+    blocking call runs on its stage's worker thread, which keeps the
+    microphone and the TTS engine on one thread each.
+    """
+
+    def __init__(self, capture, transcribe, generate, speak, queue_size=2, half_duplex=True, verbose=True, history_size=100, on_turn=None, profiler=None):
+        self.capture = capture        # () -> audio, or None if nothing was heard
+        self.transcribe = transcribe  # audio -> lowercase text ("" if not understood)
+        self.generate = generate      # text -> reply text
+        self.speak = speak            # reply text -> None
+        self.queue_size = queue_size
+        # Ignore anything recorded while the bot was talking, otherwise it hears itself
+        self.half_duplex = half_duplex
+        self.verbose = verbose  # Print replies and per-turn timings
+        self.on_turn = on_turn  # Called with each turn's TurnTimings when it completes
+        self.profiler = profiler  # Optional profiling.Profiler that times each stage
+
+        # Only the most recent turns are kept so long sessions don't grow without bound
+        self.completed_turns = deque(maxlen=history_size)
+        self.turn_count = 0
+        self._intervals = []  # (turn_id, stage, start, end) of every stage run so far
+        self._in_flight = {}  # turn_id -> TurnTimings of turns captured but not yet reported
+        self._capture_start = None  # Start of the recording in progress, which isn't a turn yet
+        self._tts_intervals = deque()  # (start, end) of recent speech output
+        self._workers = {}
+
+    async def _run_blocking(self, stage, func, *args):
+        """Runs a blocking call on the stage's worker thread."""
+        if self.profiler:
+            func = self.profiler.stage(stage, func)
+        return await asyncio.wrap_future(self._workers[stage].submit(func, *args))
+
+    def _heard_bot(self, start, end):
+        """True if a recording made between start and end overlaps the bot speaking."""
+        if not self._idle.is_set():
+            return True  # Still speaking when the recording ended
+        return any(tts_start < end and tts_end > start for tts_start, tts_end in self._tts_intervals)
+
+    def _record(self, timings, stage, start, end):
+        timings.record(stage, start, end)
+        self._intervals.append((timings.turn_id, stage, start, end))
+
+    def _overlap(self, timings):
+        """Seconds this turn's stages ran at the same time as another turn's."""
+        overlapped = 0.0
+        for start, end in timings.stages.values():
+            for turn_id, _, other_start, other_end in self._intervals:
+                if turn_id != timings.turn_id:
+                    overlapped += max(0.0, min(end, other_end) - max(start, other_start))
+        return overlapped
+
+    def _report(self, timings):
+        self._in_flight.pop(timings.turn_id, None)
+        self.completed_turns.append(timings)
+        self.turn_count += 1
+        if self.verbose:
+            stages = " | ".join(f"{stage} {timings.duration(stage):.2f}s" for stage in ("capture", "stt", "llm", "tts") if stage in timings.stages)
+            print(f"[turn {timings.turn_id}] {stages} | latency {timings.latency():.2f}s | overlapped {self._overlap(timings):.2f}s")
+        # Intervals that ended before every turn still in flight started can't overlap again.
+        # Turns can finish out of order (an empty transcript reports straight from STT), so
+        # this is the oldest unreported turn or recording, not the turn just reported.
+        starts = [start for turn in self._in_flight.values() for start, _ in turn.stages.values()]
+        if self._capture_start is not None:
+            starts.append(self._capture_start)
+        oldest_start = min(starts, default=float("inf"))
+        self._intervals = [interval for interval in self._intervals if interval[3] >= oldest_start]
+        if self.on_turn:
+            self.on_turn(timings)
+
+    async def _capture_stage(self, audio_queue):
+        turn_id = 0
+        while not self._stop.is_set():
+            if self.half_duplex:
+                await self._idle.wait()
+            start = self._capture_start = time.perf_counter()
+            # Speech that ended before this recording started can't have been picked up by it
+            while self._tts_intervals and self._tts_intervals[0][1] < start:
+                self._tts_intervals.popleft()
+            audio = await self._run_blocking("capture", self.capture)
+            if audio is None:
+                continue  # Listen timed out, check for shutdown and try again
+            if self.half_duplex and self._heard_bot(start, time.perf_counter()):
+                # The mic was already open when the reply started playing (e.g. while
+                # the model was generating), so this is (at least partly) the bot's own voice
+                continue
+            turn_id += 1
+            timings = TurnTimings(turn_id)
+            self._in_flight[turn_id] = timings
+            self._record(timings, "capture", start, time.perf_counter())
+            await audio_queue.put((timings, audio))
+
+    async def _stt_stage(self, audio_queue, text_queue):
+        while True:
+            timings, audio = await audio_queue.get()
+            start = time.perf_counter()
+            text = await self._run_blocking("stt", self.transcribe, audio)
+            del audio  # Drop the raw audio as soon as it has been recognized
+            self._record(timings, "stt", start, time.perf_counter())
+            if not text:
+                self._report(timings)
+                continue
+            if is_exit_command(text):
+                # Shut down right away instead of waiting for the model to reply
+                if self.verbose:
+                    print("Chatbot: Goodbye!")
+                self._report(timings)
+                self._stop.set()
+                return
+            await text_queue.put((timings, text))
+
+    async def _llm_stage(self, text_queue, reply_queue):
+        while True:
+            timings, text = await text_queue.get()
+            start = time.perf_counter()
+            reply = await self._run_blocking("llm", self.generate, text)
+            self._record(timings, "llm", start, time.perf_counter())
+            await reply_queue.put((timings, reply))
+
+    async def _tts_stage(self, reply_queue):
+        while True:
+            timings, reply = await reply_queue.get()
+            if self.verbose:
+                print(f"Chatbot: {reply}")
+            self._idle.clear()
+            start = time.perf_counter()
+            try:
+                await self._run_blocking("tts", self.speak, reply)
+            finally:
+                end = time.perf_counter()
+                self._tts_intervals.append((start, end))
+                self._idle.set()
+            self._record(timings, "tts", start, end)
+            self._report(timings)
+
+    async def run(self):
+        """Runs the pipeline until an exit word is heard."""
+        self._stop = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = {stage: StageWorker(f"pipeline-{stage}") for stage in ("capture", "stt", "llm", "tts")}
+
+        audio_queue = asyncio.Queue(maxsize=self.queue_size)
+        text_queue = asyncio.Queue(maxsize=self.queue_size)
+        reply_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        tasks = [
+            asyncio.create_task(self._capture_stage(audio_queue)),
+            asyncio.create_task(self._stt_stage(audio_queue, text_queue)),
+            asyncio.create_task(self._llm_stage(text_queue, reply_queue)),
+            asyncio.create_task(self._tts_stage(reply_queue)),
+        ]
+        try:
+            # The STT stage returns on an exit word; any other stage finishing means it failed
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            # Replies still queued or being generated are dropped, not waited for. Calls
+            # already running are abandoned on their daemon threads, so exit isn't delayed.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for worker in self._workers.values():
+                worker.shutdown()
+        return list(self.completed_turns)
+
+
+def run_pipeline(capture, transcribe, generate, speak, **options):
+    """Convenience wrapper that runs a VoicePipeline to completion."""
+    return asyncio.run(VoicePipeline(capture, transcribe, generate, speak, **options).run())